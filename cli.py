@@ -5,30 +5,48 @@
 
 import argparse
 import json
-import requests
 import sys
 from typing import Dict, Any
 
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 API_BASE = "http://localhost:62599"
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+# Shared session so repeated calls reuse the keep-alive connection to the API
+_SESSION = None
+
+def get_session():
+    """Create the shared HTTP session on first use"""
+    global _SESSION
+    if _SESSION is None:
+        # Imported lazily so commands like --help don't pay for loading requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        _SESSION = requests.Session()
+        _SESSION.mount("http://", HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        ))
+    return _SESSION
 
 def make_request(method: str, endpoint: str, data: Dict = None) -> Dict[str, Any]:
     """Make HTTP request to the automation API"""
     url = f"{API_BASE}{endpoint}"
     try:
-        if method.upper() == "GET":
-            response = requests.get(url)
-        elif method.upper() == "POST":
-            response = requests.post(url, json=data)
-        elif method.upper() == "PUT":
-            response = requests.put(url, json=data)
-        elif method.upper() == "DELETE":
-            response = requests.delete(url)
-        else:
-            raise ValueError(f"Unsupported method: {method}")
-        
+        response = get_session().request(method.upper(), url, json=data, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return json_loads(response.content)
+    except (OSError, ValueError) as e:
+        # requests' RequestException subclasses OSError, ValueError covers non-JSON bodies
         print(f"❌ Error: {e}")
         sys.exit(1)
 
@@ -150,21 +168,26 @@ def main():
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
     
     # List command
-    subparsers.add_parser("list", help="List all automations")
+    list_parser = subparsers.add_parser("list", help="List all automations")
+    list_parser.set_defaults(func=lambda args: list_automations())
     
     # Create command
-    subparsers.add_parser("create", help="Create new automation")
+    create_parser = subparsers.add_parser("create", help="Create new automation")
+    create_parser.set_defaults(func=lambda args: create_automation())
     
     # Execute command
     execute_parser = subparsers.add_parser("execute", help="Execute automation")
     execute_parser.add_argument("id", help="Automation ID")
+    execute_parser.set_defaults(func=lambda args: execute_automation(args.id))
     
     # Delete command
     delete_parser = subparsers.add_parser("delete", help="Delete automation")
     delete_parser.add_argument("id", help="Automation ID")
+    delete_parser.set_defaults(func=lambda args: delete_automation(args.id))
     
     # Status command
-    subparsers.add_parser("status", help="Show system status")
+    status_parser = subparsers.add_parser("status", help="Show system status")
+    status_parser.set_defaults(func=lambda args: show_status())
     
     args = parser.parse_args()
     
@@ -172,16 +195,7 @@ def main():
         parser.print_help()
         return
     
-    if args.command == "list":
-        list_automations()
-    elif args.command == "create":
-        create_automation()
-    elif args.command == "execute":
-        execute_automation(args.id)
-    elif args.command == "delete":
-        delete_automation(args.id)
-    elif args.command == "status":
-        show_status()
+    args.func(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
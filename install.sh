@@ -139,6 +139,7 @@ PyYAML==6.0.1
 python-multipart==0.0.6
 websockets==12.0
 requests==2.31.0
+orjson==3.9.10
 EOF
 
 # Install Python dependencies
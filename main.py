@@ -2,19 +2,34 @@ import logging
 import asyncio
 import json
 import os
+import time
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlencode
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, Response
 import uvicorn
 import aiohttp
 import psutil
-import subprocess
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 import yaml
 
+try:
+    import orjson
+
+    def json_dumps(obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj, indent: bool = False) -> bytes:
+        return json.dumps(obj, indent=2 if indent else None).encode()
+
+    json_loads = json.loads
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -24,6 +39,11 @@ scheduler = AsyncIOScheduler()
 # Configuration
 CONFIG_FILE = "config.yaml"
 AUTOMATIONS_FILE = "automations.json"
+METRICS_REFRESH_INTERVAL = 2  # seconds
+STATUS_BROADCAST_INTERVAL = 30  # seconds
+
+# Latest system metrics, refreshed in the background by _metrics_refresher
+_metrics_cache = {"cpu": 0.0, "mem": 0.0, "disk": 0.0, "ts": 0}
 
 class AutomationConfig(BaseModel):
     id: str
@@ -33,6 +53,15 @@ class AutomationConfig(BaseModel):
     action_type: str  # "http_post", "discord_webhook", "restart", "shutdown", "backup"
     action_config: Dict
     enabled: bool = True
+    
+    model_config = ConfigDict(frozen=True)
+    _as_dict: Optional[Dict] = PrivateAttr(default=None)
+    
+    def as_dict(self) -> Dict:
+        # The model is frozen, so the serialized form only has to be built once
+        if self._as_dict is None:
+            self._as_dict = self.model_dump(mode="json")
+        return self._as_dict
 
 class Config:
     def __init__(self):
@@ -51,39 +80,127 @@ class Config:
 
 config = Config()
 
+# Last formatted timestamp per clock (local/UTC) as (epoch second, isoformat string)
+_ts_cache = {False: (0, ""), True: (0, "")}
+
+def isonow(utc: bool = False) -> str:
+    # Timestamps only need second resolution, so the formatted string is reused within a second
+    now = int(time.time())
+    cached_at, formatted = _ts_cache[utc]
+    if cached_at != now:
+        dt = datetime.utcfromtimestamp(now) if utc else datetime.fromtimestamp(now)
+        formatted = dt.isoformat()
+        _ts_cache[utc] = (now, formatted)
+    return formatted
+
+def refresh_metrics():
+    # interval=None is non-blocking and returns usage since the previous call
+    _metrics_cache["cpu"] = psutil.cpu_percent(interval=None)
+    _metrics_cache["mem"] = psutil.virtual_memory().percent
+    _metrics_cache["disk"] = psutil.disk_usage("/").percent
+    _metrics_cache["ts"] = datetime.now().timestamp()
+
+async def _metrics_refresher():
+    while True:
+        await asyncio.sleep(METRICS_REFRESH_INTERVAL)
+        try:
+            refresh_metrics()
+        except Exception as e:
+            logger.error(f"Error refreshing system metrics: {e}")
+
+def parse_cron(cron) -> CronTrigger:
+    # Checked before the cache lookup, which would fail on unhashable values
+    if not isinstance(cron, str):
+        raise ValueError(f"cron must be a string, got {type(cron).__name__}")
+    return _parse_cron(cron)
+
+@lru_cache(maxsize=128)
+def _parse_cron(cron_str: str) -> CronTrigger:
+    # Cron format: minute hour day month day_of_week, missing fields default to "*".
+    # Triggers are stateless, so automations with the same expression share one.
+    cron_parts = (cron_str.split() + ["*"] * 5)[:5]
+    return CronTrigger.from_crontab(" ".join(cron_parts))
+
+@lru_cache(maxsize=128)
+def discord_payload_prefix(message: str) -> bytes:
+    payload = {
+        "content": message,
+        "embeds": [{
+            "title": "24Fire Automation",
+            "description": message,
+            "color": 0x00ff00
+        }]
+    }
+    # Drop the closing "}]}" so the timestamp can be spliced in on every fire
+    return json_dumps(payload)[:-3]
+
+def validate_automation(automation: AutomationConfig):
+    if automation.trigger_type == "time" and "cron" in automation.trigger_config:
+        try:
+            parse_cron(automation.trigger_config["cron"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cron expression: {e}")
+
 class AutomationManager:
     def __init__(self):
         self.automations: Dict[str, AutomationConfig] = {}
+        # Shared HTTP session, created on startup so connections are pooled across actions
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Serialized GET /automations body, cleared whenever an automation changes
+        self._list_cache: Optional[bytes] = None
+        # Created on first save so it binds to the server's running loop
+        self._save_lock: Optional[asyncio.Lock] = None
         self.load_automations()
     
     def load_automations(self):
         if os.path.exists(AUTOMATIONS_FILE):
-            with open(AUTOMATIONS_FILE, 'r') as f:
-                data = json.load(f)
+            with open(AUTOMATIONS_FILE, 'rb') as f:
+                data = json_loads(f.read())
                 for auto_data in data:
                     automation = AutomationConfig(**auto_data)
                     self.automations[automation.id] = automation
                     if automation.enabled:
                         self.schedule_automation(automation)
     
-    def save_automations(self):
-        data = [auto.dict() for auto in self.automations.values()]
-        with open(AUTOMATIONS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+    def invalidate_list_cache(self):
+        # Must be called after every change to self.automations
+        self._list_cache = None
+    
+    def list_payload(self) -> bytes:
+        if self._list_cache is None:
+            self._list_cache = json_dumps([auto.as_dict() for auto in self.automations.values()])
+        return self._list_cache
+    
+    async def save_automations(self):
+        # Serialize saves so snapshots are written in order and never share the temp file
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            data = [auto.as_dict() for auto in self.automations.values()]
+            await asyncio.get_running_loop().run_in_executor(None, self._save_sync, data)
+    
+    def _save_sync(self, data: List[Dict]):
+        # Write to a temp file first so a crash mid-write never leaves a torn file
+        tmp_file = AUTOMATIONS_FILE + ".tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(json_dumps(data, indent=True))
+            os.replace(tmp_file, AUTOMATIONS_FILE)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
     
     def schedule_automation(self, automation: AutomationConfig):
+        # Usage-based triggers have no job of their own, they are checked by poll_usage_triggers
         if automation.trigger_type == "time":
             trigger_config = automation.trigger_config
             if "cron" in trigger_config:
-                # Cron format: minute hour day month day_of_week
-                cron_parts = trigger_config["cron"].split()
-                trigger = CronTrigger(
-                    minute=cron_parts[0] if len(cron_parts) > 0 else "*",
-                    hour=cron_parts[1] if len(cron_parts) > 1 else "*",
-                    day=cron_parts[2] if len(cron_parts) > 2 else "*",
-                    month=cron_parts[3] if len(cron_parts) > 3 else "*",
-                    day_of_week=cron_parts[4] if len(cron_parts) > 4 else "*"
-                )
+                try:
+                    trigger = parse_cron(trigger_config["cron"])
+                except ValueError as e:
+                    logger.error(f"Invalid cron expression for automation {automation.name}: {e}")
+                    return
                 scheduler.add_job(
                     self.execute_automation,
                     trigger,
@@ -91,34 +208,38 @@ class AutomationManager:
                     id=automation.id,
                     replace_existing=True
                 )
-        elif automation.trigger_type == "usage":
-            # For usage-based triggers, we'll check periodically
-            scheduler.add_job(
-                self.check_usage_trigger,
-                'interval',
-                minutes=5,
-                args=[automation],
-                id=f"usage_{automation.id}",
-                replace_existing=True
-            )
-    
-    async def check_usage_trigger(self, automation: AutomationConfig):
-        trigger_config = automation.trigger_config
-        threshold = trigger_config.get("threshold", 80)
-        resource_type = trigger_config.get("resource", "cpu")  # cpu, memory, disk
+    
+    async def poll_usage_triggers(self):
+        # Sample each resource once per poll and share it across all usage automations
+        usage = {"cpu": _metrics_cache["cpu"], "memory": _metrics_cache["mem"]}
+        disk_usage = {"/": _metrics_cache["disk"]}
+        to_execute = []
         
-        if resource_type == "cpu":
-            current_usage = psutil.cpu_percent(interval=1)
-        elif resource_type == "memory":
-            current_usage = psutil.virtual_memory().percent
-        elif resource_type == "disk":
-            disk_path = trigger_config.get("path", "/")
-            current_usage = psutil.disk_usage(disk_path).percent
-        else:
-            return
+        for automation in list(self.automations.values()):
+            if not automation.enabled or automation.trigger_type != "usage":
+                continue
+            
+            trigger_config = automation.trigger_config
+            threshold = trigger_config.get("threshold", 80)
+            resource_type = trigger_config.get("resource", "cpu")  # cpu, memory, disk
+            
+            if resource_type == "disk":
+                disk_path = trigger_config.get("path", "/")
+                if disk_path not in disk_usage:
+                    try:
+                        disk_usage[disk_path] = psutil.disk_usage(disk_path).percent
+                    except OSError as e:
+                        logger.error(f"Error reading disk usage for {disk_path}: {e}")
+                        disk_usage[disk_path] = None
+                current_usage = disk_usage[disk_path]
+            else:
+                current_usage = usage.get(resource_type)
+            
+            if current_usage is not None and current_usage >= threshold:
+                to_execute.append(automation)
         
-        if current_usage >= threshold:
-            await self.execute_automation(automation)
+        if to_execute:
+            await asyncio.gather(*(self.execute_automation(a) for a in to_execute))
     
     async def execute_automation(self, automation: AutomationConfig):
         logger.info(f"Executing automation: {automation.name}")
@@ -142,35 +263,39 @@ class AutomationManager:
         headers = action_config.get("headers", {})
         data = action_config.get("data", {})
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                logger.info(f"HTTP POST to {url} - Status: {response.status}")
+        session = self._session
+        async with session.post(url, headers=headers, json=data) as response:
+            logger.info(f"HTTP POST to {url} - Status: {response.status}")
     
     async def execute_discord_webhook(self, action_config: Dict):
         webhook_url = action_config.get("url", config.discord_webhook_url)
         message = action_config.get("message", "Automation triggered")
         
-        payload = {
-            "content": message,
-            "embeds": [{
-                "title": "24Fire Automation",
-                "description": message,
-                "color": 0x00ff00,
-                "timestamp": datetime.utcnow().isoformat()
-            }]
-        }
+        prefix = discord_payload_prefix(message)
+        timestamp = isonow(utc=True)
+        body = prefix + b',"timestamp":"' + timestamp.encode() + b'"}]}'
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(webhook_url, json=payload) as response:
-                logger.info(f"Discord webhook sent - Status: {response.status}")
+        session = self._session
+        async with session.post(webhook_url, data=body, headers={"Content-Type": "application/json"}) as response:
+            logger.info(f"Discord webhook sent - Status: {response.status}")
     
     async def execute_restart(self):
         logger.info("Executing system restart")
-        subprocess.run(["sudo", "reboot"], check=False)
+        proc = await asyncio.create_subprocess_exec(
+            "sudo", "reboot",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await proc.wait()
     
     async def execute_shutdown(self):
         logger.info("Executing system shutdown")
-        subprocess.run(["sudo", "shutdown", "-h", "now"], check=False)
+        proc = await asyncio.create_subprocess_exec(
+            "sudo", "shutdown", "-h", "now",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await proc.wait()
     
     async def execute_backup(self, action_config: Dict):
         description = action_config.get("description", f"Automated backup {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -180,25 +305,111 @@ class AutomationManager:
             "Content-Type": "application/x-www-form-urlencoded",
             "X-Fire-Apikey": config.api_key
         }
-        data = f"description={description}"
+        data = urlencode({"description": description}).encode("ascii")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data=data) as response:
-                if response.status == 200:
-                    logger.info(f"Backup created successfully: {description}")
-                else:
-                    logger.error(f"Backup creation failed - Status: {response.status}")
+        session = self._session
+        async with session.post(url, headers=headers, data=data) as response:
+            if response.status == 200:
+                logger.info(f"Backup created successfully: {description}")
+            else:
+                logger.error(f"Backup creation failed - Status: {response.status}")
+
+class ConnectionManager:
+    QUEUE_SIZE = 256
+    
+    def __init__(self):
+        # Each client gets its own outgoing queue drained by a single writer task
+        self.clients: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._closing: Set[asyncio.Task] = set()
+    
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self.clients[websocket] = queue
+        self._writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
+    
+    def disconnect(self, websocket: WebSocket):
+        self.clients.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+    
+    def send(self, websocket: WebSocket, payload: bytes):
+        queue = self.clients.get(websocket)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Drop clients that can't keep up instead of buffering without bound
+            logger.warning("WebSocket client too slow, closing connection")
+            self.disconnect(websocket)
+            task = asyncio.create_task(websocket.close(code=1013))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+    
+    def broadcast(self, payload: bytes):
+        # The payload is encoded once by the caller and shared by every client
+        for websocket in list(self.clients):
+            self.send(websocket, payload)
+    
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        try:
+            while True:
+                # One JSON document per frame, so clients can parse every frame as-is
+                await websocket.send_bytes(await queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket error: {e}")
+            self.disconnect(websocket)
+
+def websocket_status() -> Dict:
+    return {
+        "timestamp": isonow(),
+        "cpu_percent": _metrics_cache["cpu"],
+        "memory_percent": _metrics_cache["mem"],
+        "disk_percent": _metrics_cache["disk"],
+    }
+
+async def _status_broadcaster():
+    while True:
+        if ws_manager.clients:
+            ws_manager.broadcast(json_dumps(websocket_status()))
+        await asyncio.sleep(STATUS_BROADCAST_INTERVAL)
 
 automation_manager = AutomationManager()
+ws_manager = ConnectionManager()
+_background_tasks: List[asyncio.Task] = []
 
 @app.on_event("startup")
 async def startup_event():
+    refresh_metrics()
+    _background_tasks.append(asyncio.create_task(_metrics_refresher()))
+    _background_tasks.append(asyncio.create_task(_status_broadcaster()))
+    scheduler.add_job(
+        automation_manager.poll_usage_triggers,
+        'interval',
+        minutes=5,
+        id="usage_triggers",
+        replace_existing=True
+    )
+    automation_manager._session = aiohttp.ClientSession(
+        json_serialize=lambda obj: json_dumps(obj).decode(),
+        timeout=aiohttp.ClientTimeout(total=30),
+        connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+    )
     scheduler.start()
     logger.info("24Fire Automation System started")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     scheduler.shutdown()
+    for task in _background_tasks:
+        task.cancel()
+    if automation_manager._session is not None:
+        await automation_manager._session.close()
 
 @app.get("/")
 async def root():
@@ -223,12 +434,15 @@ async def root():
 
 @app.get("/automations")
 async def list_automations():
-    return list(automation_manager.automations.values())
+    return Response(content=automation_manager.list_payload(), media_type="application/json")
 
 @app.post("/automations")
 async def create_automation(automation: AutomationConfig):
+    validate_automation(automation)
+    
     automation_manager.automations[automation.id] = automation
-    automation_manager.save_automations()
+    automation_manager.invalidate_list_cache()
+    await automation_manager.save_automations()
     
     if automation.enabled:
         automation_manager.schedule_automation(automation)
@@ -240,6 +454,8 @@ async def update_automation(automation_id: str, automation: AutomationConfig):
     if automation_id not in automation_manager.automations:
         raise HTTPException(status_code=404, detail="Automation not found")
     
+    validate_automation(automation)
+    
     # Remove old scheduled job
     try:
         scheduler.remove_job(automation_id)
@@ -247,7 +463,8 @@ async def update_automation(automation_id: str, automation: AutomationConfig):
         pass
     
     automation_manager.automations[automation_id] = automation
-    automation_manager.save_automations()
+    automation_manager.invalidate_list_cache()
+    await automation_manager.save_automations()
     
     if automation.enabled:
         automation_manager.schedule_automation(automation)
@@ -266,7 +483,8 @@ async def delete_automation(automation_id: str):
         pass
     
     del automation_manager.automations[automation_id]
-    automation_manager.save_automations()
+    automation_manager.invalidate_list_cache()
+    await automation_manager.save_automations()
     
     return {"message": "Automation deleted successfully"}
 
@@ -283,9 +501,9 @@ async def execute_automation(automation_id: str, background_tasks: BackgroundTas
 @app.get("/status")
 async def system_status():
     return {
-        "cpu_percent": psutil.cpu_percent(interval=1),
-        "memory_percent": psutil.virtual_memory().percent,
-        "disk_percent": psutil.disk_usage("/").percent,
+        "cpu_percent": _metrics_cache["cpu"],
+        "memory_percent": _metrics_cache["mem"],
+        "disk_percent": _metrics_cache["disk"],
         "active_automations": len([a for a in automation_manager.automations.values() if a.enabled]),
         "total_automations": len(automation_manager.automations),
         "scheduler_running": scheduler.running
@@ -293,20 +511,20 @@ async def system_status():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    await ws_manager.connect(websocket)
     try:
+        # Send the current status right away, then every 30 seconds via the broadcaster
+        ws_manager.send(websocket, json_dumps(websocket_status()))
         while True:
-            # Send system status every 30 seconds
-            status = {
-                "timestamp": datetime.now().isoformat(),
-                "cpu_percent": psutil.cpu_percent(interval=1),
-                "memory_percent": psutil.virtual_memory().percent,
-                "disk_percent": psutil.disk_usage("/").percent,
-            }
-            await websocket.send_json(status)
-            await asyncio.sleep(30)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
+        ws_manager.disconnect(websocket)
 
 if __name__ == "__main__":
-    uvicorn.run(app=app, host="0.0.0.0", port=62599)
+    uvicorn.run(app=app, host="0.0.0.0", port=62599, loop="uvloop", http="httptools")